@@ -1,11 +1,14 @@
 from __future__ import annotations
+import logging
 from dataclasses import dataclass, field
 from itertools import chain
 from typing import Any, Literal
 from pyvis.network import Network
 
+logger = logging.getLogger(__name__)
 
-@dataclass
+
+@dataclass(slots=True, eq=False)
 class Edge:
     node_from: Node
     node_to: Node
@@ -14,14 +17,22 @@ class Edge:
     attrs: dict[str, Any] = field(default_factory=dict)
     metadata: dict[str, Any] = field(default_factory=dict)
 
-    def __hash__(self) -> int:
-        return hash((self.node_from, self.node_to))
+    # Derived once from the endpoints/metadata, see __post_init__
+    _key: tuple[int, int, str, str | None] = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self._key = (self.node_from.nid, self.node_to.nid, self.relationship, self.metadata.get("name"))
+
+    @property
+    def key(self) -> tuple[int, int, str, str | None]:
+        """Identifies the edge in a graph, parallel edges differ by relationship name."""
+        return self._key
 
     def __repr__(self) -> str:
         return f"Edge({self.node_from} -> {self.node_to})"
 
 
-@dataclass
+@dataclass(slots=True, eq=False)
 class Node:
     name: str
     role: str
@@ -30,20 +41,28 @@ class Node:
     permissions: dict[str, Any] = field(default_factory=dict)
     metadata: dict[str, Any] = field(default_factory=dict)
 
-    edges_before: set[Edge] = field(default_factory=set)
-    edges_after: set[Edge] = field(default_factory=set)
+    edges_before: list[Edge] = field(default_factory=list)
+    edges_after: list[Edge] = field(default_factory=list)
+
+    # Derived once from name/permissions, see __post_init__
+    _nid: int = field(init=False, repr=False)
+    _filter_on: dict[str, Any] = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self._nid = hash(self.name)
+        self._filter_on = self.permissions.get("filter", {}).get("filter", {})
 
     @property
     def nid(self) -> int:
         """Graphiz need a numerical node id."""
-        return self.__hash__()
+        return self._nid
 
     @property
     def filter_on(self) -> dict[str, Any]:
-        return self.permissions.get("filter", {}).get("filter", {})
+        return self._filter_on
 
     def __hash__(self) -> int:
-        return hash(self.name)
+        return self._nid
 
     def __repr__(self) -> str:
         return f"Node({self.name}, {self.role})"
@@ -52,12 +71,32 @@ class Node:
 @dataclass
 class Graph:
     nodes: set[Node] = field(default_factory=set)
-    edges: set[Edge] = field(default_factory=set)
+    edges: dict[tuple[int, int, str, str | None], Edge] = field(default_factory=dict)
+
+    # Lookup indexes, kept in sync by add_node/remove_node
+    _by_name: dict[str, Node] = field(default_factory=dict, init=False, repr=False, compare=False)
+    _by_id: dict[int, Node] = field(default_factory=dict, init=False, repr=False, compare=False)
+    # Network built by show(), reset whenever nodes or edges change
+    _net: Network | None = field(default=None, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        for n in self.nodes:
+            if n.name in self._by_name:
+                raise ValueError(f"Node named {n.name} already in graph")
+            self._by_name[n.name] = n
+            self._by_id[n.nid] = n
 
     def add_node(self, n: Node):
         if n in self:
             raise ValueError(f"Node {n} already in graph")
+        # Nodes are identified by name (nid is derived from it), the indexes
+        # can only hold one node per name
+        if n.name in self._by_name:
+            raise ValueError(f"Node named {n.name} already in graph")
         self.nodes.add(n)
+        self._by_name[n.name] = n
+        self._by_id[n.nid] = n
+        self._net = None
 
     def add_edge(self, e: Edge, symmetric: bool = False):
         if e.node_from not in self:
@@ -65,10 +104,9 @@ class Graph:
         if e.node_to not in self:
             self.add_node(e.node_to)
 
-        self.edges.add(e)
-        e.node_from.edges_after.add(e)
-        e.node_to.edges_before.add(e)
+        self._insert_edge(e)
         if symmetric:
+            # Both endpoints are already in the graph
             e_sym = Edge(
                 node_from=e.node_to,
                 node_to=e.node_from,
@@ -76,7 +114,15 @@ class Graph:
                 filter_on=e.filter_on,
                 metadata=e.metadata,
             )
-            self.add_edge(e_sym, symmetric=False)
+            self._insert_edge(e_sym)
+
+    def _insert_edge(self, e: Edge):
+        # Per-node edge lists don't dedup, so guard against re-adding an edge
+        if (key := e.key) not in self.edges:
+            self.edges[key] = e
+            e.node_from.edges_after.append(e)
+            e.node_to.edges_before.append(e)
+            self._net = None
 
     def remove_node(self, n: Node):
         if n not in self:
@@ -84,23 +130,32 @@ class Graph:
         for e in list(chain(n.edges_before, n.edges_after)):
             self.remove_edge(e)
         self.nodes.remove(n)
+        del self._by_name[n.name]
+        del self._by_id[n.nid]
+        self._net = None
 
     def remove_edge(self, e: Edge):
-        e.node_from.edges_after.remove(e)
-        e.node_to.edges_before.remove(e)
-        self.edges.remove(e)
+        # Membership is by key, remove the stored edge which may be a
+        # different object than the one passed in
+        try:
+            stored = self.edges.pop(e.key)
+        except KeyError:
+            raise ValueError(f"Edge {e} not found in graph") from None
+        stored.node_from.edges_after.remove(stored)
+        stored.node_to.edges_before.remove(stored)
+        self._net = None
 
     def get_node_by_name(self, name: str) -> Node:
-        for n in self.nodes:
-            if n.name == name:
-                return n
-        raise ValueError(f"Node with name {name} not found.")
+        try:
+            return self._by_name[name]
+        except KeyError:
+            raise ValueError(f"Node with name {name} not found.") from None
 
     def get_node_by_id(self, nid: int) -> Node:
-        for n in self.nodes:
-            if n.nid == nid:
-                return n
-        raise ValueError(f"Node with id {nid} not found.")
+        try:
+            return self._by_id[nid]
+        except KeyError:
+            raise ValueError(f"Node with id {nid} not found.") from None
 
     @staticmethod
     def neighbors(node: Node) -> tuple[set[Node], set[Node]]:
@@ -115,20 +170,24 @@ class Graph:
 
     def prune_isolated_nodes(self) -> list[Node]:
         nodes_removed = []
-        for n in set(self.nodes):
+        for n in tuple(self.nodes):
             if n.is_root:
                 continue
             if not n.edges_before and not n.edges_after:
-                print("removing isolated node", n)
+                logger.debug("removing isolated node %s", n)
                 self.remove_node(n)
                 nodes_removed.append(n)
         return nodes_removed
 
     def prune_intermediary_nodes(self):
         nodes_removed = []
-        for n in set(self.nodes):
+        for n in tuple(self.nodes):
             if n.is_root:
                 continue
+            # Needs at least two distinct neighbours each way, skip building
+            # the neighbour sets for nodes that can't qualify
+            if len(n.edges_before) < 2 or len(n.edges_after) < 2:
+                continue
             nodes_before, nodes_after = self.neighbors(n)
             if len(nodes_before) == 2 and nodes_before == nodes_after:
                 n1 = nodes_before.pop()
@@ -142,11 +201,20 @@ class Graph:
                 self.add_edge(e, symmetric=True)
                 self.remove_node(n)
                 nodes_removed.append(n)
-                print("removing node", n, "connecting", n1, "with", n2)
+                logger.debug("removing node %s connecting %s with %s", n, n1, n2)
 
         return nodes_removed
 
     def show(self) -> Network:
+        """Build the pyvis network for the graph.
+
+        The same Network object is returned on every call until a node or
+        edge is added or removed, so changes made to it carry over to later
+        calls.
+        """
+        if self._net is not None:
+            return self._net
+
         net = Network(
             notebook=True,
             cdn_resources="remote",
@@ -160,33 +228,45 @@ class Graph:
         # set the physics layout of the network
         net.barnes_hut()
 
+        # Fill pyvis' node/edge option dicts directly, Network.add_edge checks
+        # both endpoints against a list of node ids, making it O(V) per edge.
+        # The dicts match what Network.add_node/add_edge would have built in
+        # pyvis 0.3.2, the dependency is pinned to 0.3.x in pyproject.toml.
+        # add_node's duplicate id check is skipped, this relies on
+        # Graph.add_node keeping names, and therefore nids, unique.
+        nodes = []
         for n in self.nodes:
-            e_from, e_to = self.neighbors(n)
-            n_neighbours = len(e_from) + len(e_to)
-            n_size = 20 + min(n_neighbours, 20)
-            color = "red" if n.is_root else "blue"
-            net.add_node(
-                n_id=n.nid,
-                name=n.name,
-                title=n.name,
-                size=n_size,
-                color=color,
-            )
+            n_edges = len(n.edges_before) + len(n.edges_after)
+            nodes.append({
+                "name": n.name,
+                "title": n.name,
+                "size": 20 + min(n_edges, 20),
+                "color": "red" if n.is_root else "blue",
+                "id": n.nid,
+                "label": n.nid,
+                "shape": "dot",
+            })
+        net.nodes.extend(nodes)
+        net.node_ids.extend(d["id"] for d in nodes)
+        net.node_map.update((d["id"], d) for d in nodes)
 
-        for e in self.edges:
-            net.add_edge(
-                e.node_from.nid,
-                e.node_to.nid,
-                arrows={"from": True},
-                arrowStrikethrough=True,
-            )
+        net.edges.extend(
+            {
+                "arrows": {"from": True},
+                "arrowStrikethrough": True,
+                "from": e.node_from.nid,
+                "to": e.node_to.nid,
+            }
+            for e in self.edges.values()
+        )
         net.toggle_physics(False)
         net.show_buttons(filter_=["physics"])
+        self._net = net
         return net
 
     def __contains__(self, key: Node | Edge) -> bool:
         if isinstance(key, Node):
             return key in self.nodes
         if isinstance(key, Edge):
-            return key in self.edges
+            return key.key in self.edges
         return False
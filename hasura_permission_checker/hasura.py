@@ -1,74 +1,88 @@
 import itertools
-import json
+import logging
 from typing import Any
 
+import orjson
+
 from hasura_permission_checker.graph import Graph, Node, Edge
 
+logger = logging.getLogger(__name__)
+
 
 class HasuraParser:
 
     @staticmethod
     def read_metadata(filename: str) -> dict[str, Any]:
-        with open(filename) as f:
-            metadata = json.loads(f.read())
+        with open(filename, "rb") as f:
+            metadata = orjson.loads(f.read())
         return metadata
 
-    def generate_all_graph(self, filename: str, role: str) -> list[Graph]:
+    def generate_all_graph(self, filename: str) -> list[Graph]:
+        """One graph per role, sorted by role name."""
         metadata = self.read_metadata(filename)
         tables = [i for i in metadata["sources"][0]["tables"]]
-        available_roles = self._get_available_roles(tables)
-        pass
+        table_names = {t["table"]["name"] for t in tables}
+        by_role = self._get_tables_by_role(tables)
+        return [self._build_graph(role, by_role[role], table_names) for role in sorted(by_role)]
 
     def generate_graph(self, filename: str, role: str) -> Graph:
-        g = Graph()
         metadata = self.read_metadata(filename)
         tables = [i for i in metadata["sources"][0]["tables"]]
+        table_names = {t["table"]["name"] for t in tables}
+        by_role = self._get_tables_by_role(tables)
+        return self._build_graph(role, by_role.get(role, []), table_names)
+
+    @classmethod
+    def _build_graph(
+        cls,
+        role: str,
+        role_tables: list[tuple[dict[str, Any], dict[str, dict[str, Any]]]],
+        table_names: set[str],
+    ) -> Graph:
+        g = Graph()
 
         # Create nodes
-        node_not_included = set()
-        for nid, t in enumerate(tables):
-            t_name = t["table"]["name"]
-            if not (permissions := self._get_selection_permissions(t, role)):
-                node_not_included.add(t_name)
-                continue
+        node_tables: list[tuple[Node, dict[str, Any]]] = []
+        for t, perms in role_tables:
+            permissions = perms[role]
             node = Node(
-                name=t_name,
-                available_roles=self._get_table_roles(t),
+                name=t["table"]["name"],
+                available_roles=list(perms),
                 permissions=permissions,
                 metadata=t,
-                is_root=self._is_root_table(t, role),
+                is_root=cls._is_root_table(permissions),
                 role=role,
             )
             g.add_node(node)
+            node_tables.append((node, t))
 
-        # Create edges
-        for t in tables:
-            t_name = t["table"]["name"]
-            try:
-                node_from = g.get_node_by_name(t_name)
-            except ValueError:
-                # Node wasn't added because it has no permissions
-                continue
-
+        # Create edges, only tables that got a node can have outgoing edges
+        for node_from, t in node_tables:
+            t_name = node_from.name
             relationships = itertools.chain(
                 t.get("array_relationships", []),
                 t.get("object_relationships", [])
             )
             for r in relationships:
-                try:
-                    # array relationship
-                    r_to = r["using"]["foreign_key_constraint_on"]["table"]["name"]
+                using = r.get("using")
+                fk = using.get("foreign_key_constraint_on") if isinstance(using, dict) else None
+                fk_table = fk.get("table") if isinstance(fk, dict) else None
+                if isinstance(fk_table, dict) and "name" in fk_table:
+                    # foreign key on the remote table
+                    r_to = fk_table["name"]
                     r_type = "1:N"
-                except (TypeError, KeyError):
-                    # object relationship
+                else:
+                    # foreign key on this table, manual configuration or a
+                    # remote table given in shorthand (plain string)
                     r_type = "1:1"
                     r_to = r["name"]
 
                 try:
                     node_to = g.get_node_by_name(r_to)
                 except ValueError:
-                    if r_to not in node_not_included:
-                        print(f"Skipping edge: unknown table {r_to} referenced by {t_name}.")
+                    # Tables without permissions for the role are skipped silently
+                    if r_to not in table_names:
+                        logger.debug("Skipping edge: unknown table %s referenced by %s.", r_to, t_name)
                     continue
 
                 edge = Edge(
@@ -84,23 +98,29 @@ class HasuraParser:
         return g
 
     @staticmethod
-    def _get_selection_permissions(table: dict[str, Any], role: str) -> dict[str, Any]:
-        for sp in table.get("select_permissions", []):
-            if sp.get("role") == role:
-                return sp.get("permission", {})
-        return {}
-
-    @staticmethod
-    def _get_table_roles(table: dict[str, Any]) -> list[str]:
-        return [r for sp in table.get("select_permissions", []) if (r := sp.get("role"))]
+    def _get_permissions_by_role(table: dict[str, Any]) -> dict[str, dict[str, Any]]:
+        """Map each role with a select permission on the table to that permission."""
+        return {
+            r: sp.get("permission", {})
+            for sp in table.get("select_permissions", [])
+            if (r := sp.get("role"))
+        }
 
     @classmethod
-    def _get_available_roles(cls, tables: list[dict[str, Any]]) -> set[str]:
-        return set(r for t in tables for r in cls._get_table_roles(t))
+    def _get_tables_by_role(
+        cls, tables: list[dict[str, Any]]
+    ) -> dict[str, list[tuple[dict[str, Any], dict[str, dict[str, Any]]]]]:
+        """Map each role to the tables it can select from, with their role -> permission map."""
+        by_role: dict[str, list[tuple[dict[str, Any], dict[str, dict[str, Any]]]]] = {}
+        for t in tables:
+            perms = cls._get_permissions_by_role(t)
+            for role, permission in perms.items():
+                if permission:
+                    by_role.setdefault(role, []).append((t, perms))
+        return by_role
 
-    @classmethod
-    def _is_root_table(cls, table: dict[str, Any], role: str) -> bool:
-        permission = cls._get_selection_permissions(table, role)
+    @staticmethod
+    def _is_root_table(permission: dict[str, Any]) -> bool:
         if not permission:
             # no permission defined, everything is allowed
             return True